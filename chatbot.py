@@ -1,3 +1,4 @@
+import asyncio
 import os
 import sys
 from gemini_manager.core import (
@@ -81,63 +82,104 @@ def print_help():
     print("/help   - Show this help message.")
     print("------------------------\n")
 
-def chat_with_bot(manager: GeminiManager, context_id: str):
-    """The main interactive chat loop."""
+async def chat_with_bot(manager: GeminiManager, context_id: str):
+    """The main interactive chat loop.
+
+    Runs on asyncio so the context save (and any RAG upsert) from the previous
+    turn overlaps with the user typing the next prompt instead of blocking the
+    loop after every response.
+    """
     print("\n--- Starting Chat ---")
     print_help()
-    
-    while True:
-        prompt = input(f"You ({context_id}): ").strip()
-
-        if not prompt:
-            continue
-        
-        # Handle commands
-        if prompt.lower() == '/exit':
-            break
-        if prompt.lower() == '/new':
-            new_context_id = select_context(manager)
-            if new_context_id:
-                context_id = new_context_id
-                print(f"\nSwitched to conversation '{context_id}'.")
-            continue
-        if prompt.lower() == '/help':
-            print_help()
-            continue
-            
-        try:
-            # 1. Get the configured API client (with a rotated key)
-            client = manager.get_client()
-
-            # 2. Prepare the full conversation history + new prompt
-            contents = manager.prepare_contents(prompt, context_id)
-            
-            # 3. Make the direct call to Google's API
-            print("Gemini: Thinking...")
-            model_name_to_use = f"models/{manager.context_strategy.model_name}"
-            response = client.generate_content(
-                model=model_name_to_use,
-                contents=contents
-            )
-            
-            # 4. Extract and print the response text
-            if not response.candidates:
-                # This can happen if the content is blocked by safety filters
-                response_text = "I'm sorry, I can't provide a response to that."
-            else:
-                response_text = response.candidates[0].content.parts[0].text
-            
-            print(f"Gemini: {response_text}")
 
-            # 5. Update our local context file with the latest turn
-            manager.update_context(prompt, response_text, context_id)
+    loop = asyncio.get_running_loop()
+    pending_update = None
+
+    try:
+        while True:
+            # input() blocks, so run it on a worker thread: the previous
+            # turn's persistence work completes while the user types.
+            prompt = (await loop.run_in_executor(None, input, f"You ({context_id}): ")).strip()
+
+            if not prompt:
+                continue
+
+            # Handle commands
+            if prompt.lower() == '/exit':
+                break
+            if prompt.lower() == '/new':
+                new_context_id = select_context(manager)
+                if new_context_id:
+                    context_id = new_context_id
+                    print(f"\nSwitched to conversation '{context_id}'.")
+                continue
+            if prompt.lower() == '/help':
+                print_help()
+                continue
 
-        except FileNotFoundError as e:
-            print(f"ERROR: {e}. This shouldn't happen in the chat loop. Exiting.")
-            break
-        except Exception as e:
-            print(f"An unexpected error occurred: {e}")
-            print("Please try again.")
+            # Make sure the previous turn has been saved before we read the
+            # context again for this one.
+            if pending_update is not None:
+                await pending_update
+                pending_update = None
+
+            # Exact repeat of an earlier prompt? Serve it from the response
+            # cache: no contents to build, no tokens, no network roundtrip.
+            cached_response = manager.try_cached_response(prompt, context_id)
+            if cached_response is not None:
+                print(f"Gemini (cached): {cached_response}")
+                continue
+
+            try:
+                # 1. Get the configured async API client (with a rotated key)
+                client = manager.get_async_client()
+
+                # 2. Prepare the full conversation history + new prompt
+                contents, context_data = manager.prepare_contents(prompt, context_id)
+
+                # 3. Stream the response from Google's API, printing each
+                # chunk as it arrives instead of waiting for the full answer.
+                print("Gemini: ", end="", flush=True)
+                stream = await client.stream_generate_content(
+                    model=manager.model_path,
+                    contents=contents
+                )
+
+                # 4. Collect the streamed chunks into the full response text
+                response_parts = []
+                async for chunk in stream:
+                    if not chunk.candidates:
+                        continue
+                    chunk_text = chunk.candidates[0].content.parts[0].text
+                    print(chunk_text, end="", flush=True)
+                    response_parts.append(chunk_text)
+                response_text = "".join(response_parts)
+                if response_text:
+                    manager.cache_response(prompt, context_id, response_text)
+                else:
+                    # This can happen if the content is blocked by safety filters.
+                    # Don't cache the apology — a later retry of the same
+                    # prompt should reach the API again.
+                    response_text = "I'm sorry, I can't provide a response to that."
+                    print(response_text, end="")
+                print()
+
+                # 5. Update our local context file in the background; the write
+                # overlaps with the next input() instead of stalling the loop.
+                pending_update = asyncio.create_task(
+                    asyncio.to_thread(manager.update_context, prompt, response_text, context_id, context_data)
+                )
+
+            except FileNotFoundError as e:
+                print(f"ERROR: {e}. This shouldn't happen in the chat loop. Exiting.")
+                break
+            except Exception as e:
+                print(f"An unexpected error occurred: {e}")
+                print("Please try again.")
+    finally:
+        # Don't lose the last turn on /exit.
+        if pending_update is not None:
+            await pending_update
 
 
 def main():
@@ -145,7 +187,7 @@ def main():
     manager = select_strategy()
     context_id = select_context(manager)
     if context_id:
-        chat_with_bot(manager, context_id)
+        asyncio.run(chat_with_bot(manager, context_id))
 
 
 if __name__ == "__main__":
@@ -7,7 +7,7 @@ def main():
     CONTEXT_NAME = "my-transparent-chat"
 
     # 1. Manually create the context
-    if not manager.list_contexts() or CONTEXT_NAME not in manager.list_contexts():
+    if not manager.has_context(CONTEXT_NAME):
         print(f"Creating context '{CONTEXT_NAME}'...")
         manager.create_context(CONTEXT_NAME)
     else:
@@ -21,12 +21,12 @@ def main():
     client_1 = manager.get_client()
 
     # 3. Prepare the contents for the API call
-    contents_1 = manager.prepare_contents(prompt_1, CONTEXT_NAME)
+    contents_1, context_data_1 = manager.prepare_contents(prompt_1, CONTEXT_NAME)
     
     # 4. Make your own, direct API call
     print("--- Making direct API call to Google... ---")
     response_1 = client_1.generate_content(
-        model=f"models/{manager.context_strategy.model_name}",
+        model=manager.model_path,
         contents=contents_1,
         # You can add other parameters here freely!
         # generation_config={"temperature": 0.8}
@@ -35,7 +35,7 @@ def main():
     print(f"Gemini: {response_text_1}")
 
     # 5. Update the context with the result
-    manager.update_context(prompt_1, response_text_1, CONTEXT_NAME)
+    manager.update_context(prompt_1, response_text_1, CONTEXT_NAME, context_data_1)
 
 
     # --- Have a second turn to test context ---
@@ -43,17 +43,17 @@ def main():
     print(f"\nUser: {prompt_2}")
 
     client_2 = manager.get_client()
-    contents_2 = manager.prepare_contents(prompt_2, CONTEXT_NAME)
+    contents_2, context_data_2 = manager.prepare_contents(prompt_2, CONTEXT_NAME)
     
     print("--- Making direct API call to Google... ---")
     response_2 = client_2.generate_content(
-        model=f"models/{manager.context_strategy.model_name}",
+        model=manager.model_path,
         contents=contents_2
     )
     response_text_2 = response_2.candidates[0].content.parts[0].text
     print(f"Gemini: {response_text_2}")
 
-    manager.update_context(prompt_2, response_text_2, CONTEXT_NAME)
+    manager.update_context(prompt_2, response_text_2, CONTEXT_NAME, context_data_2)
 
     # Cleanup
     manager.delete_context(CONTEXT_NAME)
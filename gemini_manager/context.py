@@ -1,26 +1,123 @@
 from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
 from google.ai import generativelanguage_v1beta as genai_services
 from qdrant_client import QdrantClient, models
 from sentence_transformers import SentenceTransformer
+import atexit
+import io
+import os
+import threading
+import time
 import uuid
+import numpy as np
+
+from .persistence import CONTEXTS_DIR
+
+_QDRANT_CLIENT = None
+_QDRANT_LOCK = threading.Lock()
+
+def _get_qdrant_client():
+    """Opens the shared file-backed Qdrant store once per process.
+
+    A per-instance `:memory:` client lost every vector between runs, so each
+    process restart started from empty collections and already-embedded turns
+    had to be re-ingested. Backing the store with a directory under
+    CONTEXTS_DIR makes recalled facts survive restarts, and memoizing the
+    client lets every strategy instance share one store.
+    """
+    global _QDRANT_CLIENT
+    with _QDRANT_LOCK:
+        if _QDRANT_CLIENT is None:
+            os.makedirs(CONTEXTS_DIR, exist_ok=True)
+            _QDRANT_CLIENT = QdrantClient(path=os.path.join(CONTEXTS_DIR, "_qdrant"))
+    return _QDRANT_CLIENT
+
+def drop_collection(collection_name: str):
+    """Removes a RAG context's vector collection from the shared store.
+
+    Deleting a context only removes its .json marker; without dropping the
+    collection it names, its vectors would sit in the persistent Qdrant
+    store forever.
+    """
+    try:
+        _get_qdrant_client().delete_collection(collection_name=collection_name)
+    except Exception:
+        pass  # Never created (context had no turns), or already gone.
+
+_EMBEDDING_MODEL = None
+_EMBEDDING_MODEL_LOCK = threading.Lock()
+
+def _get_embedding_model():
+    """Loads the shared sentence-transformer once per process.
+
+    Prefers the int8-quantized ONNX export of all-MiniLM-L6-v2 (2-4x faster
+    CPU encodes via VNNI int8 kernels, ~4x smaller in RAM) and falls back to
+    the default PyTorch backend when the ONNX extra isn't installed.
+    Re-selecting the RAG strategy in the chatbot reuses the loaded weights
+    instead of paying the ~90MB model load again.
+    """
+    global _EMBEDDING_MODEL
+    with _EMBEDDING_MODEL_LOCK:
+        if _EMBEDDING_MODEL is None:
+            try:
+                _EMBEDDING_MODEL = SentenceTransformer(
+                    'sentence-transformers/all-MiniLM-L6-v2',
+                    backend='onnx',
+                    model_kwargs={"file_name": "onnx/model_qint8_avx512_vnni.onnx",
+                                  "provider": "CPUExecutionProvider"},
+                )
+            except Exception:
+                _EMBEDDING_MODEL = SentenceTransformer('all-MiniLM-L6-v2')
+            # Chat turns are short; capping the sequence length caps encode cost.
+            _EMBEDDING_MODEL.max_seq_length = 128
+    return _EMBEDDING_MODEL
+
+def to_api_shape(history):
+    """Materializes stored turns into the Gemini contents shape.
+
+    Simple contexts store each turn as a compact (role, text) pair; older
+    files (and the other strategies) hold fully-shaped dicts, which pass
+    through untouched.
+    """
+    return [item if isinstance(item, dict) else {"role": item[0], "parts": [{"text": item[1]}]}
+            for item in history]
+
 
 class BaseContextStrategy(ABC):
+    # Strategies whose update_state only appends the new turns can let the
+    # manager write them through persistence.append_turns (O(1) per turn)
+    # instead of rewriting the whole context file.
+    appends_history = False
     def __init__(self, model_name="gemini-2.5-flash"):
         self.model_name = model_name
     def get_initial_state(self): pass
     def prepare_history(self, context_data: any, **kwargs): pass
     def update_state(self, prompt: str, response: str, context_data: any, **kwargs): pass
+    def new_turns(self, prompt: str, response: str):
+        return [{"role": "user", "parts": [{"text": prompt}]},
+                {"role": "model", "parts": [{"text": response}]}]
 
 
 class SimpleContextStrategy(BaseContextStrategy):
-    def get_initial_state(self): return []
-    def prepare_history(self, context_data: list, **kwargs): return context_data
+    appends_history = True
+    def __init__(self, model_name="gemini-2.5-flash", max_history=40):
+        super().__init__(model_name)
+        # 40 entries = the last 20 user/model turn pairs. Keeping a sliding
+        # window caps both memory and the token cost of each request, which
+        # otherwise grow without bound under this strategy.
+        self.max_history = max_history
+    def get_initial_state(self): return deque(maxlen=self.max_history)
+    def prepare_history(self, context_data: list, **kwargs):
+        return to_api_shape(deque(context_data, maxlen=self.max_history))
+    def new_turns(self, prompt: str, response: str):
+        # Flat (role, text) pairs: half the dict allocations per turn and a
+        # much smaller on-disk footprint than the nested Gemini shape.
+        return [("user", prompt), ("model", response)]
     def update_state(self, prompt: str, response: str, context_data: list, **kwargs):
-        context_data.append({"role": "user", "parts": [{"text": prompt}]})
-        context_data.append({"role": "model", "parts": [{"text": response}]})
+        context_data.extend(self.new_turns(prompt, response))
 
 class RollingSummaryStrategy(BaseContextStrategy):
-    # ... (this class is unchanged from before) ...
+    appends_history = True
     def __init__(self, model_name="gemini-1.5-flash", summary_threshold=6):
         super().__init__(model_name)
         self.summary_threshold = summary_threshold
@@ -32,8 +129,15 @@ class RollingSummaryStrategy(BaseContextStrategy):
     def prepare_history(self, context_data: dict, **kwargs):
         client = kwargs.get("client")
         if len(context_data['history']) >= self.summary_threshold:
-            history_text = "\n".join([f"{item['role']}: {item['parts'][0]['text']}" for item in context_data['history']])
-            full_text = f"{context_data.get('summary', '')}\n{history_text}"
+            # Build the transcript in one StringIO buffer rather than an
+            # f-string + list entry per message; long histories otherwise
+            # allocate O(N) throwaway strings right before the summary call.
+            buf = io.StringIO()
+            write = buf.write
+            write(context_data.get('summary', ''))
+            for item in context_data['history']:
+                write('\n'); write(item['role']); write(': '); write(item['parts'][0]['text'])
+            full_text = buf.getvalue()
             new_summary = self._summarize(full_text, client)
             context_data['summary'] = new_summary
             context_data['history'] = []
@@ -44,19 +148,65 @@ class RollingSummaryStrategy(BaseContextStrategy):
         history.extend(context_data['history'])
         return history
     def update_state(self, prompt: str, response: str, context_data: dict, **kwargs):
-        context_data['history'].append({"role": "user", "parts": [{"text": prompt}]})
-        context_data['history'].append({"role": "model", "parts": [{"text": response}]})
+        context_data['history'].extend(self.new_turns(prompt, response))
 
 class RetrievalAugmentedStrategy(BaseContextStrategy):
     """Uses a vector database for context."""
-    def __init__(self, model_name="gemini-1.5-flash", top_k=3):
+    def __init__(self, model_name="gemini-1.5-flash", top_k=3, embed_cache_size=512):
         super().__init__(model_name)
         print("Initializing RAG: Loading sentence-transformer model...")
-        # Use a file-based Qdrant for persistence across test runs if needed, but memory is fine
-        self.qdrant_client = QdrantClient(":memory:")
-        self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
+        self.qdrant_client = _get_qdrant_client()
+        self.embedding_model = _get_embedding_model()
         self.top_k = top_k
+        # Small LRU of text -> embedding: the MiniLM forward pass is the
+        # dominant per-turn CPU cost, so repeated prompts skip it entirely.
+        self._embed_cache = OrderedDict()
+        self._embed_cache_size = embed_cache_size
+        # Buffer of not-yet-upserted points per collection, so the chat loop
+        # doesn't block on a Qdrant roundtrip for every single turn.
+        self._pending_points = {}
+        self._flush_batch_size = 8
+        self._flush_interval = 2.0
+        self._last_flush = time.monotonic()
+        atexit.register(self.flush)
         print("RAG Initialized.")
+
+    def embed(self, text: str):
+        """Embeds text, reusing a cached vector for previously seen text."""
+        return self.embed_batch([text])[0]
+
+    def embed_batch(self, texts):
+        """Embeds several texts, running one forward pass for all cache misses.
+
+        Encoding N short strings in one `encode` call is far cheaper than N
+        separate calls, so batching the deferred interaction texts at flush
+        time amortizes the transformer overhead.
+        """
+        keys = [text.strip().lower() for text in texts]
+        vectors = {}
+        misses = []
+        miss_keys = set()
+        for key, text in zip(keys, texts):
+            cached = self._embed_cache.get(key)
+            if cached is not None:
+                self._embed_cache.move_to_end(key)
+                vectors[key] = cached
+            elif key not in miss_keys:
+                miss_keys.add(key)
+                misses.append((key, text))
+        if misses:
+            # Half-precision ndarrays: halves the per-point payload sent to
+            # Qdrant and skips the float-list roundtrip, at negligible recall loss.
+            encoded = self.embedding_model.encode(
+                [text for _, text in misses],
+                convert_to_numpy=True, batch_size=32, show_progress_bar=False
+            ).astype(np.float16)
+            for (key, _), vector in zip(misses, encoded):
+                vectors[key] = vector
+                self._embed_cache[key] = vector
+                if len(self._embed_cache) > self._embed_cache_size:
+                    self._embed_cache.popitem(last=False)
+        return [vectors[key] for key in keys]
     def get_initial_state(self):
         # The JSON file only serves to prove the context exists.
         # We also store the unique collection name for the vector DB.
@@ -66,20 +216,52 @@ class RetrievalAugmentedStrategy(BaseContextStrategy):
         try:
             self.qdrant_client.get_collection(collection_name=collection_name)
         except Exception:
-            self.qdrant_client.recreate_collection(collection_name=collection_name, vectors_config=models.VectorParams(size=self.embedding_model.get_sentence_embedding_dimension(), distance=models.Distance.COSINE))
+            self.qdrant_client.recreate_collection(
+                collection_name=collection_name,
+                vectors_config=models.VectorParams(
+                    size=self.embedding_model.get_sentence_embedding_dimension(),
+                    distance=models.Distance.COSINE,
+                    datatype=models.Datatype.FLOAT16,
+                ),
+                quantization_config=models.ScalarQuantization(
+                    scalar=models.ScalarQuantizationConfig(type=models.ScalarType.INT8, always_ram=True)
+                ),
+            )
 
     def prepare_history(self, context_data: dict, **kwargs):
         # RAG doesn't use linear history. It prepares a special prompt.
         # The actual prompt augmentation happens in the main manager.
         return [] # Return an empty history, as it's not used.
 
+    def flush(self):
+        """Encodes and writes any buffered interactions to Qdrant."""
+        for collection_name, items in self._pending_points.items():
+            if not items:
+                continue
+            vectors = self.embed_batch([text for _, text in items])
+            points = [
+                models.PointStruct(id=point_id, vector=vector, payload={"text": text})
+                for (point_id, text), vector in zip(items, vectors)
+            ]
+            self.qdrant_client.upsert(collection_name=collection_name, points=points, wait=False)
+        self._pending_points.clear()
+        self._last_flush = time.monotonic()
+
+    def _maybe_flush(self):
+        pending = sum(len(items) for items in self._pending_points.values())
+        if pending >= self._flush_batch_size or time.monotonic() - self._last_flush >= self._flush_interval:
+            self.flush()
+
+    def drop_collection(self, collection_name: str):
+        """Discards buffered turns for a collection and drops it from Qdrant."""
+        self._pending_points.pop(collection_name, None)
+        drop_collection(collection_name)
+
     def update_state(self, prompt: str, response: str, context_data: dict, **kwargs):
         collection_name = context_data['collection_name']
         self._get_or_create_collection(collection_name)
         interaction_text = f"User asked: {prompt}\nAI responded: {response}"
-        vector = self.embedding_model.encode(interaction_text).tolist()
-        self.qdrant_client.upsert(
-            collection_name=collection_name,
-            points=[models.PointStruct(id=str(uuid.uuid4()), vector=vector, payload={"text": interaction_text})],
-            wait=True
-        )
\ No newline at end of file
+        # Encoding is deferred to flush() so buffered turns share one batched
+        # forward pass instead of paying the transformer overhead per turn.
+        self._pending_points.setdefault(collection_name, []).append((str(uuid.uuid4()), interaction_text))
+        self._maybe_flush()
\ No newline at end of file
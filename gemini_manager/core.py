@@ -1,49 +1,154 @@
+import contextlib
+import functools
+import hashlib
 import os
-from collections import deque
+from collections import OrderedDict
 from dotenv import load_dotenv
 import uuid
 from google.ai import generativelanguage_v1beta as genai_services
 from google.api_core import client_options
 from . import persistence
-from .context import BaseContextStrategy, SimpleContextStrategy, RollingSummaryStrategy, RetrievalAugmentedStrategy
+from .context import BaseContextStrategy, SimpleContextStrategy, RollingSummaryStrategy, RetrievalAugmentedStrategy, drop_collection
+
+@functools.lru_cache(maxsize=1)
+def _load_api_keys():
+    """Reads and parses GEMINI_API_KEYS once per process.
+
+    Makes GeminiManager cheap to re-instantiate (the /new flow can build
+    several managers); the .env file isn't re-read or re-parsed each time.
+    """
+    load_dotenv()
+    api_keys_str = os.getenv("GEMINI_API_KEYS")
+    if not api_keys_str: raise ValueError("GEMINI_API_KEYS not found in .env file.")
+    return tuple(key.strip() for key in api_keys_str.split(','))
+
+# One client per API key, shared by every manager in the process: building
+# a client opens a fresh gRPC channel (DNS + TLS + HTTP/2 setup), so
+# rotation reuses the already-open channel for a key instead of paying that
+# every turn — even when several managers rotate over the same keys.
+@functools.lru_cache(maxsize=None)
+def _client_for(api_key: str):
+    opts = client_options.ClientOptions(api_key=api_key)
+    return genai_services.GenerativeServiceClient(client_options=opts)
+
+@functools.lru_cache(maxsize=None)
+def _async_client_for(api_key: str):
+    opts = client_options.ClientOptions(api_key=api_key)
+    return genai_services.GenerativeServiceAsyncClient(client_options=opts)
 
 class GeminiManager:
-    # ... (all methods before prepare_contents are unchanged) ...
     def __init__(self, context_strategy: BaseContextStrategy = SimpleContextStrategy()):
-        load_dotenv()
-        api_keys_str = os.getenv("GEMINI_API_KEYS")
-        if not api_keys_str: raise ValueError("GEMINI_API_KEYS not found in .env file.")
-        self.api_keys = deque([key.strip() for key in api_keys_str.split(',')])
+        # Tuple + rotating index instead of deque.rotate: selection is two
+        # plain attribute ops with no container mutation per call.
+        self.api_keys = _load_api_keys()
+        self._key_idx = 0
         self.context_strategy = context_strategy
+        self.model_path = f"models/{context_strategy.model_name}"
+        # Contexts with an open batch(): updates mutate these in memory and
+        # are written out once when the batch closes.
+        self._open_batches = {}
+        # Exact-match response cache (Cache-Augmented Generation): repeated
+        # prompts in the same context skip the API call entirely.
+        self._response_cache = OrderedDict()
+        self._response_cache_size = 256
         persistence._ensure_dir()
         print(f"GeminiManager initialized with {len(self.api_keys)} keys and '{type(context_strategy).__name__}' strategy.")
     def _get_next_key(self):
-        current_key = self.api_keys[0]
-        self.api_keys.rotate(-1)
+        current_key = self.api_keys[self._key_idx]
+        self._key_idx = (self._key_idx + 1) % len(self.api_keys)
         return current_key
+    def set_context_strategy(self, context_strategy: BaseContextStrategy):
+        """Swaps the active strategy, refreshing strategy-derived state."""
+        self.context_strategy = context_strategy
+        self.model_path = f"models/{context_strategy.model_name}"
     def list_contexts(self): return persistence.list_contexts()
+    def has_context(self, context_id: str):
+        # One stat instead of the full directory scan list_contexts does.
+        return persistence.context_exists(context_id)
     def create_context(self, context_id: str):
         initial_data = self.context_strategy.get_initial_state()
         persistence.create_new_context(context_id, initial_data)
-    def delete_context(self, context_id: str): persistence.delete_context(context_id)
+    def delete_context(self, context_id: str):
+        # A RAG context's vectors live in the shared Qdrant store, not in
+        # its .json marker; drop its collection too or every deleted RAG
+        # context leaks vectors on disk.
+        try:
+            context_data = persistence.load_context(context_id)
+        except Exception:
+            # Deleting must still work on a damaged context (truncated or
+            # unparsable file); we just can't drop a collection for it.
+            context_data = None
+        if isinstance(context_data, dict) and context_data.get('collection_name'):
+            collection_name = context_data['collection_name']
+            if isinstance(self.context_strategy, RetrievalAugmentedStrategy):
+                self.context_strategy.drop_collection(collection_name)
+            else:
+                drop_collection(collection_name)
+        persistence.delete_context(context_id)
     def get_client(self):
         api_key = self._get_next_key()
         print(f"--- Providing client with API Key ending in: ...{api_key[-4:]} ---")
-        opts = client_options.ClientOptions(api_key=api_key)
-        return genai_services.GenerativeServiceClient(client_options=opts)
+        return _client_for(api_key)
+
+    @contextlib.contextmanager
+    def batch(self, context_id: str):
+        """Groups a run of update_context calls into a single write.
+
+        Inside the block, updates mutate the loaded state in memory; the
+        context is persisted once on exit instead of once per call. Collapses
+        N load+save round-trips into one for bulk ingestion loops.
+        """
+        context_data = persistence.load_context(context_id)
+        self._open_batches[context_id] = context_data
+        try:
+            yield context_data
+        finally:
+            del self._open_batches[context_id]
+            persistence.save_context(context_id, context_data)
+
+    def _response_cache_key(self, prompt: str, context_id: str):
+        return hashlib.sha256((prompt.strip().lower() + "|" + context_id).encode("utf-8")).digest()
+
+    def try_cached_response(self, prompt: str, context_id: str):
+        """Returns a previously cached response for this prompt+context, or None."""
+        key = self._response_cache_key(prompt, context_id)
+        cached = self._response_cache.get(key)
+        if cached is not None:
+            self._response_cache.move_to_end(key)
+        return cached
+
+    def cache_response(self, prompt: str, context_id: str, response_text: str):
+        """Remembers a response so an identical prompt can skip the API call."""
+        self._response_cache[self._response_cache_key(prompt, context_id)] = response_text
+        if len(self._response_cache) > self._response_cache_size:
+            self._response_cache.popitem(last=False)
+
+    def get_async_client(self):
+        """Same as get_client, but returns the asyncio variant of the service client."""
+        api_key = self._get_next_key()
+        print(f"--- Providing async client with API Key ending in: ...{api_key[-4:]} ---")
+        return _async_client_for(api_key)
 
 
     def prepare_contents(self, prompt: str, context_id: str):
+        """Builds the outbound contents for a turn.
+
+        Returns `(contents, context_data)`. Hand `context_data` back to
+        `update_context` after the API call so the same parsed state is
+        reused instead of re-loading the context from disk.
+        """
         if not persistence.context_exists(context_id):
             raise FileNotFoundError(f"Context '{context_id}' not found.")
 
         context_data = persistence.load_context(context_id)
-        
+
         if isinstance(self.context_strategy, RetrievalAugmentedStrategy):
             rag_strategy = self.context_strategy
             collection_name = context_data['collection_name']
-            
-            query_vector = rag_strategy.embedding_model.encode(prompt).tolist()
+
+            # Make sure any buffered turns are searchable before we query.
+            rag_strategy.flush()
+            query_vector = rag_strategy.embed(prompt)
             
             # --- THE FIX IS HERE ---
             # We add a `score_threshold` to filter out irrelevant results,
@@ -60,18 +165,57 @@ class GeminiManager:
                 augmented_prompt = (f"Given the following relevant information from our past conversation:\n--- BEGIN CONTEXT ---\n{retrieved_context}\n--- END CONTEXT ---\n\nNow, please answer this question: {prompt}")
             else:
                 augmented_prompt = prompt
-            
-            return [{"role": "user", "parts": [{"text": augmented_prompt}]}]
-        
-        client_for_summary = self.get_client() if isinstance(self.context_strategy, RollingSummaryStrategy) else None
-        history = self.context_strategy.prepare_history(context_data, client=client_for_summary)
-        persistence.save_context(context_id, context_data)
-        return history + [{"role": "user", "parts": [{"text": prompt}]}]
-
-    def update_context(self, prompt: str, response_text: str, context_id: str):
-        # ... (this method is unchanged) ...
+
+            return [{"role": "user", "parts": [{"text": augmented_prompt}]}], context_data
+
+        if isinstance(self.context_strategy, RollingSummaryStrategy):
+            history_len_before = len(context_data['history'])
+            history = self.context_strategy.prepare_history(context_data, client=self.get_client())
+            # Summarization folds the stored turns into the summary and
+            # clears the history; that shrink is the only mutation here that
+            # needs a save. (The summary text itself is no signal — a re-run
+            # can produce the identical summary.)
+            if len(context_data['history']) != history_len_before:
+                persistence.save_context(context_id, context_data)
+        else:
+            history = self.context_strategy.prepare_history(context_data)
+        return history + [{"role": "user", "parts": [{"text": prompt}]}], context_data
+
+    def update_context(self, prompt: str, response_text: str, context_id: str, context_data=None):
         if not persistence.context_exists(context_id): return
-        context_data = persistence.load_context(context_id)
-        self.context_strategy.update_state(prompt, response_text, context_data)
-        persistence.save_context(context_id, context_data)
-        print(f"--- Context '{context_id}' updated. ---")
\ No newline at end of file
+        batched = self._open_batches.get(context_id)
+        if batched is not None:
+            # An open batch() owns persistence; just mutate the shared state.
+            self.context_strategy.update_state(prompt, response_text, batched)
+            print(f"--- Context '{context_id}' updated (batched). ---")
+            return
+        if self.context_strategy.appends_history:
+            # The new turns just go onto the transcript log; no need to load
+            # and rewrite the whole context.
+            persistence.append_turns(context_id, self.context_strategy.new_turns(prompt, response_text))
+        elif context_data is not None:
+            # Reuse the state prepare_contents already parsed.
+            self.context_strategy.update_state(prompt, response_text, context_data)
+            persistence.save_context(context_id, context_data)
+        else:
+            # One fused load/mutate/save cycle under a single lock.
+            with persistence.open_context(context_id) as context_data:
+                self.context_strategy.update_state(prompt, response_text, context_data)
+        print(f"--- Context '{context_id}' updated. ---")
+
+    @contextlib.contextmanager
+    def turn(self, prompt: str, context_id: str):
+        """Fuses prepare_contents and update_context for one conversation turn.
+
+        Yields `(contents, response)`: make the API call with `contents` and
+        set `response['text']` to the model's reply before the block ends.
+        The update then reuses the state prepare already parsed, so the
+        context is loaded once per turn instead of once per half. Leaving
+        `response['text']` unset (e.g. a cached reply, or an API failure that
+        raised out of the block) skips the update.
+        """
+        contents, context_data = self.prepare_contents(prompt, context_id)
+        response = {}
+        yield contents, response
+        if 'text' in response:
+            self.update_context(prompt, response['text'], context_id, context_data)
\ No newline at end of file
@@ -1,20 +1,140 @@
+import functools
+import hashlib
 import os
 import json
-from typing import List, Dict, Any
+import copy
+import fcntl
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Iterator, List, Dict, Any, Optional, Tuple
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+    _MSGSPEC_ENCODER = msgspec.json.Encoder()
+    _MSGSPEC_DECODER = msgspec.json.Decoder()
+except ImportError:
+    msgspec = None
+
+try:
+    import zstandard as zstd
+    _ZSTD_COMPRESSOR = zstd.ZstdCompressor(level=3)
+    _ZSTD_DECOMPRESSOR = zstd.ZstdDecompressor()
+except ImportError:
+    zstd = None
 
 CONTEXTS_DIR = "contexts"
 
+# Metadata blobs below this size are left as plain JSON; compressing tiny
+# files costs more than it saves. Large blobs (legacy single-file histories,
+# fat summaries) shrink ~5-8x with zstd level 3.
+_COMPRESS_THRESHOLD = 4096
+
+def _loads(raw: bytes) -> Any:
+    """Parses JSON bytes through the fastest available codec."""
+    if orjson is not None:
+        return orjson.loads(raw)
+    if msgspec is not None:
+        return _MSGSPEC_DECODER.decode(raw)
+    return json.loads(raw)
+
+def _dumps_compact(data: Any) -> bytes:
+    """Serializes to compact JSON bytes through the fastest available codec."""
+    if orjson is not None:
+        return orjson.dumps(data)
+    if msgspec is not None:
+        return _MSGSPEC_ENCODER.encode(data)
+    return json.dumps(data, separators=(',', ':'), ensure_ascii=False).encode("utf-8")
+
+def _dumps_line(turn: Any) -> bytes:
+    """Serializes one transcript turn as a compact JSONL line."""
+    return _dumps_compact(turn) + b"\n"
+
+def _copy(data: Any) -> Any:
+    """Deep-copies a JSON-shaped tree for the cache.
+
+    A serialize/parse roundtrip through the C codec is much faster than
+    copy.deepcopy for these dict/list/str trees, and it normalizes the copy
+    to exactly what a cold read from disk would return.
+    """
+    if orjson is not None or msgspec is not None:
+        return _loads(_dumps_compact(data))
+    return copy.deepcopy(data)
+
+# Process-local cache of parsed context data, keyed by context_id.
+# Each entry stores the mtimes of the context's files alongside a private
+# copy of the merged data, so repeated load_context calls for an unchanged
+# context skip the open+parse entirely (prepare_contents and update_context
+# both load the same context every turn).
+_CACHE: "OrderedDict[str, Tuple[Tuple[int, int], Any]]" = OrderedDict()
+_CACHE_MAX = 128
+# (directory mtime, ids): any create/delete bumps the directory's mtime, so
+# the cache invalidates itself without callers having to remember to.
+_LIST_CACHE: Optional[Tuple[int, List[str]]] = None
+
+def _cache_store(context_id: str, mtimes: Tuple[int, int], data: Any) -> None:
+    """Stores a cache entry, evicting the least recently used beyond the cap."""
+    _CACHE[context_id] = (mtimes, data)
+    _CACHE.move_to_end(context_id)
+    if len(_CACHE) > _CACHE_MAX:
+        _CACHE.popitem(last=False)
+
 def _ensure_dir() -> None:
     """Ensures the context directory exists."""
     os.makedirs(CONTEXTS_DIR, exist_ok=True)
 
+# Both path builders are pure string work, but every load/save/lock/delete
+# rebuilds them several times per turn; memoizing makes repeat lookups a
+# dict hit instead of an os.path.join.
+@functools.lru_cache(maxsize=256)
 def _get_path(context_id: str) -> str:
     """Gets the full path for a given context ID."""
     return os.path.join(CONTEXTS_DIR, f"{context_id}.json")
 
+@functools.lru_cache(maxsize=256)
+def _get_history_path(context_id: str) -> str:
+    """Gets the path of the append-only transcript log for a context."""
+    return os.path.join(CONTEXTS_DIR, f"{context_id}.jsonl")
+
+def _find_meta_path(context_id: str) -> str:
+    """Returns the metadata path that exists on disk (plain or .zst), or the
+    plain default when neither exists yet."""
+    plain = _get_path(context_id)
+    if os.path.exists(plain):
+        return plain
+    compressed = plain + ".zst"
+    if os.path.exists(compressed):
+        return compressed
+    return plain
+
+def _mtimes(context_id: str) -> Tuple[int, int]:
+    """Returns (metadata mtime, transcript mtime) for cache validation."""
+    meta_mtime = os.stat(_find_meta_path(context_id)).st_mtime_ns
+    try:
+        history_mtime = os.stat(_get_history_path(context_id)).st_mtime_ns
+    except FileNotFoundError:
+        history_mtime = 0
+    return (meta_mtime, history_mtime)
+
+@contextmanager
+def _locked(context_id: str) -> Iterator[None]:
+    """Holds an exclusive advisory lock for a context while writing it."""
+    lock_path = _get_path(context_id) + ".lock"
+    lock_fd = os.open(lock_path, os.O_CREAT | os.O_RDWR)
+    try:
+        fcntl.flock(lock_fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        fcntl.flock(lock_fd, fcntl.LOCK_UN)
+        os.close(lock_fd)
+
 def context_exists(context_id: str) -> bool:
     """Checks if a context file already exists."""
-    return os.path.exists(_get_path(context_id))
+    return os.path.exists(_get_path(context_id)) or os.path.exists(_get_path(context_id) + ".zst")
 
 def create_new_context(context_id: str, initial_data: Any) -> None:
     """Creates a new context file, raising an error if it already exists."""
@@ -23,28 +143,182 @@ def create_new_context(context_id: str, initial_data: Any) -> None:
     save_context(context_id, initial_data)
     print(f"Successfully created context '{context_id}'.")
 
+def _load_turns(context_id: str) -> List[Any]:
+    """Loads all transcript turns from the JSONL log (empty if there is none)."""
+    try:
+        with open(_get_history_path(context_id), 'rb') as f:
+            return [_loads(line) for line in f if line.strip()]
+    except FileNotFoundError:
+        return []
+
 def load_context(context_id: str) -> Any:
-    """Loads context data from a JSON file."""
+    """Loads context data (metadata merged with the transcript log), using the
+    in-memory cache when both files are unchanged."""
     if not context_exists(context_id):
         raise FileNotFoundError(f"Context '{context_id}' not found. Create it first with `create_context`.")
-    with open(_get_path(context_id), 'r') as f:
-        return json.load(f)
+    mtimes = _mtimes(context_id)
+    cached = _CACHE.get(context_id)
+    if cached is not None and cached[0] == mtimes:
+        _CACHE.move_to_end(context_id)
+        # Hand out a copy so in-place mutation by strategies can't corrupt the cache.
+        return _copy(cached[1])
+    meta_path = _find_meta_path(context_id)
+    with open(meta_path, 'rb') as f:
+        raw = f.read()
+    if meta_path.endswith(".zst"):
+        if zstd is None:
+            raise RuntimeError(f"Context '{context_id}' is zstd-compressed but the 'zstandard' package is not installed.")
+        raw = _ZSTD_DECOMPRESSOR.decompress(raw)
+    data = _loads(raw)
+    turns = _load_turns(context_id)
+    if turns:
+        if isinstance(data, list):
+            data.extend(turns)
+        elif isinstance(data, dict) and isinstance(data.get('history'), list):
+            data['history'].extend(turns)
+    _cache_store(context_id, mtimes, _copy(data))
+    return data
+
+def _write_atomic(path: str, payload: bytes) -> None:
+    """Writes bytes to a temp sibling and renames it into place."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        # Single write call: avoids the many small writes json.dump issues.
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    # Atomic on POSIX: readers see either the old file or the new one,
+    # never a half-written blob.
+    os.replace(tmp_path, path)
+
+# Digest of the metadata payload last written per context, so byte-identical
+# re-saves (idempotent updates, no-op summary triggers) skip the disk write.
+_LAST_META_HASH: Dict[str, bytes] = {}
+
+def _write_meta(context_id: str, payload: bytes) -> None:
+    """Writes the metadata blob, zstd-compressed once it is worth it.
+
+    A save whose serialized bytes match the last write is a no-op: the file
+    on disk is already exactly this payload, so rewriting (and re-fsyncing)
+    it buys nothing.
+    """
+    plain = _get_path(context_id)
+    compressed = plain + ".zst"
+    use_zstd = zstd is not None and len(payload) >= _COMPRESS_THRESHOLD
+    digest = hashlib.blake2b(payload, digest_size=16).digest()
+    if _LAST_META_HASH.get(context_id) == digest and os.path.exists(compressed if use_zstd else plain):
+        return
+    if use_zstd:
+        _write_atomic(compressed, _ZSTD_COMPRESSOR.compress(payload))
+        if os.path.exists(plain):
+            os.remove(plain)
+    else:
+        _write_atomic(plain, payload)
+        if os.path.exists(compressed):
+            os.remove(compressed)
+    _LAST_META_HASH[context_id] = digest
+
+def _save_unlocked(context_id: str, data: Any) -> None:
+    """save_context body; the caller must already hold the context lock."""
+    _ensure_dir()
+    meta: Any = data
+    turns: Optional[List[Any]] = None
+    if isinstance(data, (list, deque)):
+        meta, turns = [], list(data)
+    elif isinstance(data, dict) and isinstance(data.get('history'), list):
+        meta = dict(data)
+        turns = meta['history']
+        meta['history'] = []
+    history_path = _get_history_path(context_id)
+    # Compact separators: context files are machine-read only, so the
+    # indentation and padding were pure byte overhead on every save and load.
+    _write_meta(context_id, _dumps_compact(meta))
+    if turns:
+        _write_atomic(history_path, b"".join(_dumps_line(t) for t in turns))
+    elif turns is not None and os.path.exists(history_path):
+        os.remove(history_path)
+    # Cache the list form so cached loads match what a disk read would return.
+    cached_data = list(data) if isinstance(data, deque) else data
+    _cache_store(context_id, _mtimes(context_id), _copy(cached_data))
 
 def save_context(context_id: str, data: Any) -> None:
-    """Saves context data to a JSON file."""
+    """Saves context data, splitting the transcript out into the JSONL log.
+
+    The small metadata file keeps everything except the turn list; the turns
+    themselves live in `{id}.jsonl` so that `append_turns` can add new ones
+    in O(1) instead of rewriting the whole history each turn.
+    """
     _ensure_dir()
-    with open(_get_path(context_id), 'w') as f:
-        json.dump(data, f, indent=2)
+    with _locked(context_id):
+        _save_unlocked(context_id, data)
+
+@contextmanager
+def open_context(context_id: str) -> Iterator[Any]:
+    """Loads a context, yields it for in-place mutation, and saves it once.
+
+    Fuses the load/mutate/save cycle of a turn into one critical section:
+    the advisory lock is held across the whole read-modify-write instead of
+    being taken separately for each half, and callers get a single entry
+    point instead of a load_context/save_context pair.
+    """
+    if not context_exists(context_id):
+        raise FileNotFoundError(f"Context '{context_id}' not found. Create it first with `create_context`.")
+    with _locked(context_id):
+        data = load_context(context_id)
+        yield data
+        _save_unlocked(context_id, data)
+
+def append_turns(context_id: str, turns: List[Any]) -> None:
+    """Appends new turns to the transcript log without rewriting the history."""
+    if not context_exists(context_id):
+        raise FileNotFoundError(f"Context '{context_id}' not found. Create it first with `create_context`.")
+    with _locked(context_id):
+        with open(_get_history_path(context_id), 'ab') as f:
+            f.write(b"".join(_dumps_line(t) for t in turns))
+    cached = _CACHE.get(context_id)
+    if cached is not None:
+        data = cached[1]
+        if isinstance(data, (list, deque)):
+            data.extend(_copy(turns))
+        elif isinstance(data, dict) and isinstance(data.get('history'), list):
+            data['history'].extend(_copy(turns))
+        _cache_store(context_id, _mtimes(context_id), data)
 
 def list_contexts() -> List[str]:
-    """Lists all available context IDs."""
-    _ensure_dir()
-    return [f.replace(".json", "") for f in os.listdir(CONTEXTS_DIR) if f.endswith(".json")]
+    """Lists all available context IDs, re-scanning only when the directory
+    has actually changed."""
+    global _LIST_CACHE
+    try:
+        dir_mtime = os.stat(CONTEXTS_DIR).st_mtime_ns
+    except FileNotFoundError:
+        _ensure_dir()
+        dir_mtime = os.stat(CONTEXTS_DIR).st_mtime_ns
+    if _LIST_CACHE is not None and _LIST_CACHE[0] == dir_mtime:
+        return list(_LIST_CACHE[1])
+    with os.scandir(CONTEXTS_DIR) as entries:
+        # Slicing off the suffix beats str.replace, which scans the
+        # whole name (and would mangle ids containing '.json').
+        found = []
+        for e in entries:
+            if not e.is_file():
+                continue
+            if e.name.endswith('.json'):
+                found.append(e.name[:-5])
+            elif e.name.endswith('.json.zst'):
+                found.append(e.name[:-9])
+    _LIST_CACHE = (dir_mtime, found)
+    return list(found)
 
 def delete_context(context_id: str) -> None:
     """Deletes a context file."""
+    _CACHE.pop(context_id, None)
+    _LAST_META_HASH.pop(context_id, None)
     if context_exists(context_id):
-        os.remove(_get_path(context_id))
+        os.remove(_find_meta_path(context_id))
+        for leftover in (_get_history_path(context_id), _get_path(context_id) + ".zst",
+                         _get_path(context_id) + ".lock", _get_path(context_id) + ".tmp"):
+            if os.path.exists(leftover):
+                os.remove(leftover)
         print(f"Successfully deleted context '{context_id}'.")
     else:
         print(f"Context '{context_id}' not found, nothing to delete.")
\ No newline at end of file
@@ -1,44 +1,123 @@
 import os
-import time
+import sys
+import threading
 import json
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from gemini_manager.core import (
     GeminiManager,
     SimpleContextStrategy,
     RollingSummaryStrategy,
     RetrievalAugmentedStrategy,
+    drop_collection,
     persistence
 )
 
-# --- Test Suite Runner (Unchanged) ---
+# --- Test Suite Runner ---
+
+# One shared GeminiManager per strategy class: construction (key parsing,
+# client/cache setup) is paid once per strategy. NOTE: this relies on each
+# test owning its strategy class outright, as the current three do — two
+# concurrent tests using the same class with different configs would swap
+# the shared manager's strategy mid-flight. Give such a test its own
+# manager instead of routing it through this pool.
+_managers = {}
+_managers_lock = threading.Lock()
+
+def get_manager(strategy):
+    """Returns the shared GeminiManager for this strategy's class."""
+    with _managers_lock:
+        manager = _managers.get(type(strategy))
+        if manager is None:
+            manager = GeminiManager(context_strategy=strategy)
+            _managers[type(strategy)] = manager
+        else:
+            manager.set_context_strategy(strategy)
+        return manager
+
+
+# Every on-disk extension a context can leave behind, including the lock
+# files persistence creates on each save/append and .tmp leftovers from an
+# interrupted atomic write.
+CONTEXT_FILE_SUFFIXES = (".json", ".json.zst", ".jsonl", ".json.lock", ".json.tmp", ".json.zst.tmp")
+
+def _drop_linked_collection(path):
+    """Drops the Qdrant collection a RAG context marker points to, if any.
+
+    Teardown removes context files directly rather than through
+    manager.delete_context, so without this every RAG test run would leave
+    its uuid-named collection behind in the persistent store.
+    """
+    try:
+        with open(path, 'rb') as f:
+            data = json.load(f)
+    except (ValueError, OSError):
+        return
+    if isinstance(data, dict) and data.get('collection_name'):
+        drop_collection(data['collection_name'])
+
+def cleanup_contexts(context_names):
+    """Removes all files belonging to the given contexts with one directory scan.
+
+    A single scandir replaces the per-file os.path.exists probes, so teardown
+    costs one readdir instead of a stat per candidate file.
+    """
+    try:
+        with os.scandir("contexts") as entries:
+            present = {e.name for e in entries if e.is_file()}
+    except FileNotFoundError:
+        return False
+    targets = {f"{name}{suffix}" for name in context_names for suffix in CONTEXT_FILE_SUFFIXES}
+    to_remove = targets & present
+    for filename in to_remove:
+        path = os.path.join("contexts", filename)
+        if filename.endswith(".json"):
+            _drop_linked_collection(path)
+        os.remove(path)
+    return bool(to_remove)
+
+# Registered test functions, in definition order. The decorator only
+# collects them; the main block decides how (and whether) to run each one.
+_TESTS = []
+_print_lock = threading.Lock()
+
 def run_test(test_function):
-    """A decorator to run a test with standardized output and cleanup."""
+    """A decorator that registers a test for the suite runner."""
+    _TESTS.append(test_function)
+    return test_function
+
+def _invoke(test_function):
+    """Runs one registered test with standardized output and cleanup."""
     test_name = test_function.__name__
-    print(f"\n{'='*20} RUNNING: {test_name} {'='*20}")
+    with _print_lock:
+        print(f"\n{'='*20} RUNNING: {test_name} {'='*20}")
     try:
         test_function()
-        print(f"--- RESULT: PASSED ---")
+        with _print_lock:
+            print(f"--- RESULT: {test_name} PASSED ---")
     except Exception as e:
-        print(f"--- RESULT: FAILED ---")
-        print(f"--- ERROR: {type(e).__name__}: {e} ---")
+        with _print_lock:
+            print(f"--- RESULT: {test_name} FAILED ---")
+            print(f"--- ERROR: {type(e).__name__}: {e} ---")
         raise
     finally:
         context_name = f"{test_name}_context"
-        if os.path.exists(os.path.join("contexts", f"{context_name}.json")):
-            os.remove(os.path.join("contexts", f"{context_name}.json"))
-            print(f"--- Cleaned up '{context_name}.json' ---")
+        if cleanup_contexts([context_name]):
+            with _print_lock:
+                print(f"--- Cleaned up '{context_name}' files ---")
 
 
-# --- Test Cases (These will be run automatically by the decorator) ---
+# --- Test Cases (collected by @run_test, executed by the main block) ---
 
 @run_test
 def test_simple_strategy_remembers_context():
     CONTEXT_NAME = "test_simple_strategy_remembers_context_context"
-    manager = GeminiManager(context_strategy=SimpleContextStrategy())
+    manager = get_manager(SimpleContextStrategy())
     manager.create_context(CONTEXT_NAME)
     fact = "The launch code for Nebula is Tango-Charlie-Niner."
-    manager.update_context(fact, "I will remember that.", CONTEXT_NAME)
+    with manager.turn(fact, CONTEXT_NAME) as (contents, response):
+        response['text'] = "I will remember that."
     question = "What is the launch code for Nebula?"
-    prepared_contents = manager.prepare_contents(question, CONTEXT_NAME)
+    prepared_contents, _ = manager.prepare_contents(question, CONTEXT_NAME)
     assert len(prepared_contents) == 3, "Prepared contents should have history (2) + new prompt (1)."
     assert fact in prepared_contents[0]["parts"][0]["text"], "The original fact is missing from the prepared history."
     print("-> OK: Simple strategy correctly recalled the conversation history.")
@@ -48,15 +127,16 @@ def test_simple_strategy_remembers_context():
 def test_rolling_summary_strategy_summarizes_and_forgets():
     CONTEXT_NAME = "test_rolling_summary_strategy_summarizes_and_forgets_context"
     strategy = RollingSummaryStrategy(summary_threshold=2)
-    manager = GeminiManager(context_strategy=strategy)
+    manager = get_manager(strategy)
     manager.create_context(CONTEXT_NAME)
     fact1 = "The meeting is with 'CyberDyne Systems'."
     fact2 = "The primary topic is the 'Skynet' proposal."
     response1 = "Information noted."
-    manager.update_context(f"{fact1} {fact2}", response1, CONTEXT_NAME)
+    with manager.turn(f"{fact1} {fact2}", CONTEXT_NAME) as (contents, response):
+        response['text'] = response1
     print("Preparing contents, which should trigger a summary...")
     question = "What is the main topic of our meeting?"
-    prepared_contents = manager.prepare_contents(question, CONTEXT_NAME)
+    prepared_contents, _ = manager.prepare_contents(question, CONTEXT_NAME)
     context_data = persistence.load_context(CONTEXT_NAME)
     assert len(context_data['history']) == 0, "History list was not cleared after summarization."
     assert context_data['summary'], "Summary field is empty."
@@ -69,35 +149,59 @@ def test_rolling_summary_strategy_summarizes_and_forgets():
 @run_test
 def test_rag_strategy_retrieves_relevant_fact():
     CONTEXT_NAME = "test_rag_strategy_retrieves_relevant_fact_context"
-    manager = GeminiManager(context_strategy=RetrievalAugmentedStrategy())
+    manager = get_manager(RetrievalAugmentedStrategy())
     manager.create_context(CONTEXT_NAME)
     unique_fact = "The secret ingredient for the 'Chronos' project is ytterbium-infused quartz."
-    manager.update_context(unique_fact, "Fact stored.", CONTEXT_NAME)
-    print("-> OK: Taught the model a unique fact.")
-    manager.update_context("What's the weather today?", "It is sunny.", CONTEXT_NAME)
-    manager.update_context("Tell me about the Roman Empire.", "It was a vast empire...", CONTEXT_NAME)
+    # Group the ingestion turns into one batch so the context file is
+    # written once instead of once per update.
+    with manager.batch(CONTEXT_NAME):
+        manager.update_context(unique_fact, "Fact stored.", CONTEXT_NAME)
+        print("-> OK: Taught the model a unique fact.")
+        manager.update_context("What's the weather today?", "It is sunny.", CONTEXT_NAME)
+        manager.update_context("Tell me about the Roman Empire.", "It was a vast empire...", CONTEXT_NAME)
     print("-> OK: Added distraction conversation.")
-    time.sleep(1)
+    # Indexing is deterministic: flush() pushes any buffered turns to Qdrant
+    # synchronously (prepare_contents also flushes before every search), so
+    # there is nothing to sleep for.
+    manager.context_strategy.flush()
     question = "What is the special ingredient for the Chronos project?"
-    prepared_contents = manager.prepare_contents(question, CONTEXT_NAME)
+    prepared_contents, _ = manager.prepare_contents(question, CONTEXT_NAME)
     final_prompt = prepared_contents[0]['parts'][0]['text']
     assert "ytterbium-infused quartz" in final_prompt, "RAG failed to retrieve and inject the relevant fact."
     assert "Roman Empire" not in final_prompt, "RAG incorrectly retrieved irrelevant information."
     print("-> OK: RAG correctly augmented the prompt with the specific fact.")
 
 
-# --- Main Execution Block (FIXED) ---
+# --- Main Execution Block ---
 if __name__ == "__main__":
     print("\n\nStarting Context Strategy Test Suite...")
-    
-    # A single cleanup before all tests start. The decorator handles cleanup after each test.
-    if os.path.exists("contexts"):
-        for f in os.listdir("contexts"):
-            if f.endswith(".json"):
-                os.remove(os.path.join("contexts", f))
-    
-    # The tests above are automatically run when Python loads the file because of the @run_test decorator.
-    # This block will only be executed AFTER all the tests have finished running.
-    # Therefore, we do not call them again here.
-    
-    print("\nAll strategy tests have completed.")
\ No newline at end of file
+
+    # A single cleanup before all tests start. _invoke handles cleanup after each test.
+    try:
+        with os.scandir("contexts") as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name.endswith(CONTEXT_FILE_SUFFIXES):
+                    if entry.name.endswith(".json"):
+                        _drop_linked_collection(entry.path)
+                    os.remove(entry.path)
+    except FileNotFoundError:
+        pass
+
+    # TEST_FILTER=rag python tests.py runs only the tests whose name
+    # contains the given substring; collection is free since @run_test no
+    # longer executes anything.
+    name_filter = os.getenv("TEST_FILTER", "")
+    tests = [test for test in _TESTS if name_filter in test.__name__]
+
+    # Each test works on its own context names, so they are independent and
+    # the suite's wall-clock approaches the slowest single test instead of
+    # the sum of all of them.
+    with ThreadPoolExecutor(max_workers=max(len(tests), 1)) as pool:
+        futures = [pool.submit(_invoke, test) for test in tests]
+        failed = sum(1 for future in as_completed(futures) if future.exception() is not None)
+
+    print(f"\nAll strategy tests have completed. ({len(tests) - failed} passed, {failed} failed)")
+    if failed:
+        # Scripted callers (CI) rely on the exit status; the serial runner
+        # used to abort nonzero on the first failure.
+        sys.exit(1)
\ No newline at end of file